@@ -2,27 +2,167 @@ import asyncio
 import os
 import sys
 import json
-import re
+import logging
+import threading
+import time
+from datetime import timedelta
 from typing import Optional
 from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import google.generativeai as genai
+from google.generativeai import caching
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 load_dotenv()
 
+# Full prompts and tool results are only logged when GEMINI_MCP_VERBOSE is set (e.g. GEMINI_MCP_VERBOSE=1).
+logging.basicConfig(format="%(asctime)s [%(levelname)s] %(name)s:%(lineno)d - %(message)s")
+logger = logging.getLogger(__name__)
+logger.setLevel(
+    logging.DEBUG if os.environ.get("GEMINI_MCP_VERBOSE", "").lower() in ("1", "true", "yes") else logging.INFO)
+
+# Tool schemas don't change during a session, so the tool list is only re-fetched after this many seconds.
+TOOLS_CACHE_TTL = 300.0
+
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# The static part of the decision prompt (instructions + tool schemas) is uploaded once as Gemini cached
+# content, provided it reaches the minimum size Gemini accepts for context caching. Context caching only
+# works with an explicitly versioned model, so cached decisions use this snapshot of GEMINI_MODEL.
+DECISION_CACHE_MODEL = "models/gemini-1.5-flash-001"
+DECISION_CACHE_MIN_TOKENS = 32768
+DECISION_CACHE_TTL = timedelta(hours=1)
+
+# Prompt templates. The decision prompt is split after the tool schemas: the prefix only depends on the tool
+# list (so it can go into the Gemini cache), the rest is filled in per query.
+DECISION_PREFIX_TEMPLATE = """
+You are an expert assistant that decides whether to use a tool to answer a user's request.
+You have access to the following tools:
+{tools}
+"""
+
+DECISION_PROMPT_TEMPLATE = """
+The user's request is: "{query}"
+
+Based on the request, decide which action to take:
+1. If a tool is necessary, respond with ONLY a single JSON object in the format: {{"type": "tool", "name": "tool_name", "parameter": {{"arg1": "value1", ...}}}}
+2. If no tool is needed, respond with ONLY a single JSON object in the format: {{"type": "text", "text": "Your conversational response here."}}
+
+Do not add any explanations or markdown formatting like ```json.
+"""
+
+SUMMARY_PROMPT_TEMPLATE = """
+You are a helpful assistant. You have just used a tool to get information for a user.
+- The user's original query was: "{query}"
+- You decided to call the tool: "{tool_name}"
+- The result from the tool is: "{tool_result}"
+
+Based on this, provide a friendly, natural language summary to the user.
+Directly answer their original question conversationally. Do not mention the tool name or the raw data.
+"""
+
+# Maximum number of queries processed at the same time when queries are piped in on stdin.
+BULK_CONCURRENCY = 8
+
+# Structured tool results with at most this many items are formatted locally instead of being summarized by Gemini.
+LOCAL_RENDER_MAX_ITEMS = 3
+
+# Local formatting for the weather tools' structured results: (key of the item list, header, line per item).
+LOCAL_RENDER_TEMPLATES = {
+    "get_alerts": ("alerts", "Active weather alerts for {state}:", "- {event}: {area}"),
+    "get_forecast": ("periods", "Here is the forecast:", "- {name}: {temperature}°{temperature_unit}, {forecast}"),
+}
+
+
+def dumps_json(obj) -> str:
+    """Serializes to indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+
+def loads_json(text: str):
+    """Parses JSON, using orjson when it is installed. Both raise json.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def structured_tool_result(tool_result, tool_output_text: str):
+    """Returns the structured content of a tool result, falling back to parsing its text as JSON."""
+    structured = getattr(tool_result, "structuredContent", None)
+    if structured is not None:
+        return structured
+    try:
+        return loads_json(tool_output_text)
+    except ValueError:
+        return None
+
+
+def render_tool_result(tool_name: str, result) -> Optional[str]:
+    """Formats a small structured tool result locally, or returns None if Gemini should summarize it."""
+    if tool_name not in LOCAL_RENDER_TEMPLATES or not isinstance(result, dict):
+        return None
+    items_key, header, line = LOCAL_RENDER_TEMPLATES[tool_name]
+    items = result.get(items_key)
+    if not items:
+        # Errors and empty results only carry a message.
+        return result.get("message")
+    if not isinstance(items, list) or len(items) > LOCAL_RENDER_MAX_ITEMS:
+        return None
+    try:
+        return "\n".join([header.format(**result), *(line.format(**item) for item in items)])
+    except (KeyError, TypeError):
+        return None
+
+
+async def read_line(prompt: str) -> str:
+    """Reads a line from stdin in a daemon thread, so background tasks keep running while the user types."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(prompt)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(resolve, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
 
 class GeminiMCPChat:
     def __init__(self):
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        self._tools_cache: Optional[tuple[list, str, float]] = None
+        self._decision_cache: Optional[caching.CachedContent] = None
+        self._decision_model: Optional[genai.GenerativeModel] = None
+        self._decision_prefix = ""
+        self._decision_tools_json: Optional[str] = None
+        self._decision_expires_at = 0.0
+        # MCP sessions and Gemini models handle concurrent requests themselves; this lock only keeps
+        # concurrent queries from refreshing the tool list and the Gemini cache more than once.
+        self._refresh_lock = asyncio.Lock()
+        self._warmup_task: Optional[asyncio.Task] = None
         try:
             api_key = os.environ.get("GEMINI_API_KEY")
             if not api_key:
                 raise KeyError
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(model_name="gemini-1.5-flash")
+            self.model = genai.GenerativeModel(model_name=GEMINI_MODEL)
         except KeyError:
             print("ERROR: GEMINI_API_KEY not found in the .env file.")
             sys.exit(1)
@@ -36,64 +176,126 @@ class GeminiMCPChat:
         self.read, self.write = stdio_transport
         self.session = await self.exit_stack.enter_async_context(ClientSession(self.read, self.write))
         await self.session.initialize()
-        response = await self.session.list_tools()
-        print(f"[CLIENT] Successfully connected. Available tools: {[tool.name for tool in response.tools]}")
+        available_tools, _ = await self._get_tools()
+        print(f"[CLIENT] Successfully connected. Available tools: {[tool['name'] for tool in available_tools]}")
 
-    def _create_decision_prompt(self, query: str, tools: list) -> str:
-        tools_as_json_string = json.dumps(tools, indent=2)
-        return f"""
-You are an expert assistant that decides whether to use a tool to answer a user's request.
-You have access to the following tools:
-{tools_as_json_string}
+        # Set up the Gemini cache for the decision prompt in the background while the user types the first
+        # query. _get_decision_model holds the refresh lock meanwhile, so the first query waits for it if needed.
+        # It only logs at debug level, so nothing gets printed over the prompt or between bulk query output.
+        self._warmup_task = asyncio.create_task(self._get_decision_model())
 
-The user's request is: "{query}"
+    async def _get_tools(self) -> tuple[list, str]:
+        """Returns the available tools and their JSON rendering, re-fetching them once the cache is stale."""
+        if self._tools_cache is not None:
+            available_tools, tools_as_json_string, fetched_at = self._tools_cache
+            if time.monotonic() - fetched_at < TOOLS_CACHE_TTL:
+                return available_tools, tools_as_json_string
 
-Based on the request, decide which action to take:
-1. If a tool is necessary, respond with ONLY a single JSON object in the format: {{"type": "tool", "name": "tool_name", "parameter": {{"arg1": "value1", ...}}}}
-2. If no tool is needed, respond with ONLY a single JSON object in the format: {{"type": "text", "text": "Your conversational response here."}}
+        print("[CLIENT] >> Sending 'ListToolsRequest' to MCP server...")
+        tool_list_response = await self.session.list_tools()
+        available_tools = [{"name": t.name, "description": t.description, "input_schema": t.inputSchema} for t in
+                           tool_list_response.tools]
+        tools_as_json_string = dumps_json(available_tools)
+        self._tools_cache = (available_tools, tools_as_json_string, time.monotonic())
+        print("[CLIENT] << Received 'ListToolsResponse' from MCP server.")
+        return available_tools, tools_as_json_string
 
-Do not add any explanations or markdown formatting like ```json.
-"""
+    def invalidate_tools_cache(self):
+        """Forces the next query to re-fetch the tool list from the server and rebuild the Gemini cache."""
+        self._tools_cache = None
+        self._decision_tools_json = None
 
-    def _create_summary_prompt(self, original_query: str, tool_name: str, tool_result: str) -> str:
-        return f"""
-You are a helpful assistant. You have just used a tool to get information for a user.
-- The user's original query was: "{original_query}"
-- You decided to call the tool: "{tool_name}"
-- The result from the tool is: "{tool_result}"
+    async def _get_decision_model(self) -> tuple[genai.GenerativeModel, str]:
+        """Returns the model used for decisions and the prompt prefix that still has to be sent with each query.
 
-Based on this, provide a friendly, natural language summary to the user.
-Directly answer their original question conversationally. Do not mention the tool name or the raw data.
-"""
+        The prefix only depends on the tool schemas, so it is stored as Gemini cached content and rebuilt
+        when the tools change or the cache is about to expire. If the prefix is below Gemini's minimum
+        cacheable size (DECISION_CACHE_MIN_TOKENS) or caching fails, it is sent along with every query instead.
+        """
+        async with self._refresh_lock:
+            _, tools_as_json_string = await self._get_tools()
+            if (self._decision_model is not None and self._decision_tools_json == tools_as_json_string
+                    and time.monotonic() < self._decision_expires_at):
+                return self._decision_model, self._decision_prefix
+
+            await self._delete_decision_cache()
+            prefix = self._create_decision_prefix(tools_as_json_string)
+            self._decision_model = self.model
+            self._decision_prefix = prefix
+            self._decision_expires_at = float("inf")
+            self._decision_tools_json = tools_as_json_string
+            try:
+                prefix_tokens = (await self.model.count_tokens_async(prefix)).total_tokens
+            except Exception as e:
+                logger.debug("[CLIENT] Could not count the decision prompt tokens, not caching it. Error: %s", e)
+                return self._decision_model, self._decision_prefix
+            if prefix_tokens < DECISION_CACHE_MIN_TOKENS:
+                logger.debug("[CLIENT] Decision prompt prefix has %d tokens, below the %d needed for Gemini "
+                             "context caching; sending it with every query.", prefix_tokens, DECISION_CACHE_MIN_TOKENS)
+                return self._decision_model, self._decision_prefix
 
-    async def process_query(self, query: str):
+            try:
+                self._decision_cache = await asyncio.to_thread(
+                    caching.CachedContent.create, model=DECISION_CACHE_MODEL, contents=[prefix], ttl=DECISION_CACHE_TTL)
+                self._decision_model = genai.GenerativeModel.from_cached_content(self._decision_cache)
+                self._decision_prefix = ""
+                # Rebuild a minute early so a query never hits an expired cache.
+                self._decision_expires_at = time.monotonic() + DECISION_CACHE_TTL.total_seconds() - 60
+                logger.debug("[CLIENT] * Cached the tool schemas on Gemini for decision prompts.")
+            except Exception as e:
+                logger.debug("[CLIENT] Could not cache the tool schemas on Gemini, sending them with every query. "
+                             "Error: %s", e)
+            return self._decision_model, self._decision_prefix
+
+    async def _delete_decision_cache(self):
+        if self._decision_cache is None:
+            return
+        cache, self._decision_cache = self._decision_cache, None
+        try:
+            await asyncio.to_thread(cache.delete)
+        except Exception as e:
+            print(f"[CLIENT] !! Could not delete the cached tool schemas on Gemini. Error: {e}")
+
+    def _create_decision_prefix(self, tools_as_json_string: str) -> str:
+        return DECISION_PREFIX_TEMPLATE.format(tools=tools_as_json_string)
+
+    def _create_decision_prompt(self, query: str) -> str:
+        return DECISION_PROMPT_TEMPLATE.format(query=query)
+
+    def _create_summary_prompt(self, original_query: str, tool_name: str, tool_result: str) -> str:
+        return SUMMARY_PROMPT_TEMPLATE.format(query=original_query, tool_name=tool_name, tool_result=tool_result)
+
+    async def process_query(self, query: str, bulk: bool = False):
+        """Answers a query. With bulk=True the summary is printed in one go and the final response is labelled
+        with its query, so the answers to concurrently processed queries stay apart and can be told apart."""
         print(f"\n[CLIENT] > Processing new query: '{query}'")
+        final_header = f"[FINAL RESPONSE] '{query}':" if bulk else "[FINAL RESPONSE] Gemini:"
 
-        # 1. Get the list of available tools from the server
-        print("[CLIENT] >> Sending 'ListToolsRequest' to MCP server...")
-        tool_list_response = await self.session.list_tools()
-        available_tools = [{"name": t.name, "description": t.description, "input_schema": t.inputSchema} for t in
-                           tool_list_response.tools]
-        print("[CLIENT] << Received 'ListToolsResponse' from MCP server.")
+        # 1. Get the decision model. The tool list is cached, and with Gemini context caching the
+        #    tool schemas are already on Gemini's side, so only the query-specific part is sent.
+        decision_model, decision_prefix = await self._get_decision_model()
 
         # 2. Ask Gemini to make a decision: use a tool or reply with text?
-        prompt = self._create_decision_prompt(query, available_tools)
-        print("\n" + "=" * 25 + " [PROMPT FOR GEMINI: Decision Making] " + "=" * 25)
-        print(prompt.strip())
-        print("=" * 80 + "\n")
+        prompt = decision_prefix + self._create_decision_prompt(query)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n%s [PROMPT FOR GEMINI: Decision Making] %s\n%s\n%s",
+                         "=" * 25, "=" * 25, prompt.strip(), "=" * 80)
 
-        response = await self.model.generate_content_async(prompt)
+        response = await decision_model.generate_content_async(prompt)
 
         try:
             raw_response_text = response.text.strip()
             print(f"[GEMINI] < Raw decision response from Gemini: {raw_response_text}")
-            cleaned_json_text = re.sub(r"```json\n|\n```", "", raw_response_text, flags=re.MULTILINE).strip()
-            decision = json.loads(cleaned_json_text)
+            cleaned_json_text = raw_response_text
+            if not cleaned_json_text.startswith("{"):
+                # Strip a markdown code fence around the JSON, in case Gemini adds one anyway.
+                cleaned_json_text = cleaned_json_text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+            decision = loads_json(cleaned_json_text)
             print(f"[CLIENT] * Gemini's decision parsed successfully: {decision}")
         except (json.JSONDecodeError, AttributeError, ValueError) as e:
             print(f"[CLIENT] !! ERROR: Could not parse Gemini's response as JSON. Error: {e}")
             print(f"[CLIENT] Displaying the raw text as a fallback response.")
-            print("\n[FINAL RESPONSE] Gemini:\n", response.text)
+            print(f"\n{final_header}\n", response.text)
             return
 
         # 3. Act on Gemini's decision
@@ -107,53 +309,103 @@ Directly answer their original question conversationally. Do not mention the too
                 print(f"[CLIENT] >> Sending 'CallToolRequest' for '{tool_name}' to MCP server...")
                 tool_result_obj = await self.session.call_tool(tool_name, tool_args)
                 print(f"[CLIENT] << Received 'CallToolResponse' from MCP server.")
-                tool_output_text = "".join([c.text for c in tool_result_obj.content if c.type == 'text'])
-                print(
-                    f"[CLIENT] * Extracted tool result (first 300 chars): {tool_output_text[:300].replace('\n', ' ')}...")
+                tool_output_text = "".join(c.text for c in tool_result_obj.content if c.type == "text")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[CLIENT] * Extracted tool result (first 300 chars): %s...",
+                                 tool_output_text[:300].replace("\n", " "))
+
+                # 5. Small structured results are formatted locally, which saves the summarization call
+                local_response = render_tool_result(
+                    tool_name, structured_tool_result(tool_result_obj, tool_output_text))
+                if local_response is not None:
+                    print("[CLIENT] * Tool result is small enough to answer without a summarization call.")
+                    # Gemini didn't write this answer, so don't attribute it (bulk headers only name the query).
+                    print(f"\n{final_header}" if bulk else "\n[FINAL RESPONSE]:")
+                    print(local_response)
+                    return
 
-                # 5. Ask Gemini to summarize the tool's result
+                # 6. Otherwise ask Gemini to summarize the tool's result
                 summary_prompt = self._create_summary_prompt(query, tool_name, tool_output_text)
-                print("\n" + "=" * 25 + " [PROMPT FOR GEMINI: Summarization] " + "=" * 26)
-                print(summary_prompt.strip())
-                print("=" * 80 + "\n")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("\n%s [PROMPT FOR GEMINI: Summarization] %s\n%s\n%s",
+                                 "=" * 25, "=" * 26, summary_prompt.strip(), "=" * 80)
 
-                summary_response = await self.model.generate_content_async(summary_prompt)
-                print(f"[GEMINI] < Raw summary response from Gemini: {summary_response.text.strip()}")
-                print("\n[FINAL RESPONSE] Gemini:")
-                print(summary_response.text)
+                if not bulk:
+                    # Print the summary as it is generated instead of waiting for the whole response.
+                    summary_response = await self.model.generate_content_async(summary_prompt, stream=True)
+                    print(f"\n{final_header}")
+                    async for chunk in summary_response:
+                        if chunk.parts:
+                            print(chunk.text, end="", flush=True)
+                    print()
+                else:
+                    summary_response = await self.model.generate_content_async(summary_prompt)
+                    print(f"\n{final_header}")
+                    print(summary_response.text)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[GEMINI] < Raw summary response from Gemini: %s", summary_response.text.strip())
 
             except Exception as e:
                 print(f"[CLIENT] !! ERROR during tool call or summarization: {e}")
                 print(
-                    "\n[FINAL RESPONSE] Gemini:\nSorry, I encountered an error while trying to process your request with a tool.")
+                    f"\n{final_header}\nSorry, I encountered an error while trying to process your request with a tool.")
 
         elif decision.get("type") == "text":
             print("[CLIENT] -> Gemini chose to respond with text directly.")
-            print("\n[FINAL RESPONSE] Gemini:")
+            print(f"\n{final_header}")
             print(decision.get("text", "I received a text response, but it was empty."))
         else:
             print(f"[CLIENT] !! ERROR: Received an unknown decision type from Gemini: {decision}")
             print(
-                "\n[FINAL RESPONSE] Gemini:\nI'm not sure how to proceed with that. Please try rephrasing your request.")
+                f"\n{final_header}\nI'm not sure how to proceed with that. Please try rephrasing your request.")
 
     async def chat_loop(self):
+        if not sys.stdin.isatty():
+            await self.bulk_loop()
+            return
+
         print("\n--- Gemini MCP Chat Client ---")
         print("Type your query or 'quit' to exit.")
         print("Example: 'what are the weather alerts for NY?' or 'forecast for san francisco'")
 
         while True:
             try:
-                query = input("\nYou: ").strip()
+                query = (await read_line("\nYou: ")).strip()
                 if query.lower() in ['quit', 'exit']: break
                 if not query: continue
                 await self.process_query(query)
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 break
             except Exception as e:
                 print(f"\nAn unexpected error occurred in the chat loop: {e}")
 
+    async def bulk_loop(self):
+        """Processes queries piped in on stdin (one per line) concurrently instead of one at a time."""
+        print("[CLIENT] stdin is not a terminal, reading queries from stdin until EOF (one per line)...")
+        queries = []
+        for line in sys.stdin:
+            query = line.strip()
+            if query.lower() in ['quit', 'exit']: break
+            if query: queries.append(query)
+        print(f"[CLIENT] Processing {len(queries)} queries from stdin, up to {BULK_CONCURRENCY} at a time...")
+
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+        async def process_bounded(query: str):
+            async with semaphore:
+                try:
+                    await self.process_query(query, bulk=True)
+                except Exception as e:
+                    print(f"\nAn unexpected error occurred while processing '{query}': {e}")
+
+        await asyncio.gather(*(process_bounded(query) for query in queries))
+
     async def cleanup(self):
         print("\n[CLIENT] Cleaning up and closing connections...")
+        if self._warmup_task is not None:
+            # Let a cache creation that is still in flight finish, so the cache below can be deleted.
+            await asyncio.gather(self._warmup_task, return_exceptions=True)
+        await self._delete_decision_cache()
         await self.exit_stack.aclose()
 
 
@@ -175,6 +427,14 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        # Optional: uvloop makes socket and pipe IO faster. It isn't available on Windows,
+        # where the default event loop is used.
+        import uvloop
+        run = uvloop.run
+    except ImportError:
+        run = asyncio.run
+
+    try:
+        run(main())
     except KeyboardInterrupt:
         print("\nProgram terminated by user.")
\ No newline at end of file
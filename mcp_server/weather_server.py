@@ -1,8 +1,20 @@
-from typing import Any
+import asyncio
+import functools
+import importlib.util
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
 import httpx
 from mcp.server.fastmcp import FastMCP
 import logging
 
+try:
+    import orjson
+    _loads_json = orjson.loads
+except ImportError:
+    _loads_json = json.loads
+
 # Configure basic logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -10,80 +22,193 @@ logging.basicConfig(
 )
 
 
-# Initialize the FastMCP server
-mcp = FastMCP("weather_tools")
-
 # Constants
 NWS_API_BASE = "https://api.weather.gov"
 USER_AGENT = "gemini-mcp-client/1.0 (contact@example.com)"
 
+# Identical NWS requests within this window are answered from memory, and concurrent ones share a single fetch.
+RESPONSE_CACHE_TTL = 60.0
+RESPONSE_CACHE_MAX_ENTRIES = 128
+_response_cache: dict[str, tuple[float, asyncio.Task]] = {}
+
+# NWS grid metadata for a location is stable for weeks, so '/points' lookups are cached in-process.
+POINTS_CACHE_TTL = 24 * 60 * 60
+POINTS_CACHE_MAX_ENTRIES = 128
+_points_cache: dict[tuple[float, float], tuple[float, dict[str, Any]]] = {}
+
+# Shared client so that connections (and TLS sessions) to the NWS API are reused across tool calls.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Returns the shared NWS API client, creating it on first use."""
+    global _client
+    if _client is None:
+        transport = httpx.AsyncHTTPTransport(
+            # HTTP/2 needs the 'h2' package, which comes with httpx[http2].
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_keepalive_connections=10),
+            # Retry failed connection attempts.
+            retries=2,
+        )
+        _client = httpx.AsyncClient(
+            base_url=NWS_API_BASE,
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept": "application/geo+json"
+            },
+            timeout=15.0,
+            transport=transport,
+        )
+    return _client
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Closes the shared NWS API client when the server shuts down."""
+    global _client
+    try:
+        yield
+    finally:
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+
+
+# Initialize the FastMCP server
+mcp = FastMCP("weather_tools", lifespan=lifespan)
+
 
 async def make_nws_request(url: str) -> dict[str, Any] | None:
+    """Makes a request to the NWS API, reusing a recent or in-flight response for the same URL."""
+    now = time.monotonic()
+    cached = _response_cache.get(url)
+    if cached is not None and now - cached[0] < RESPONSE_CACHE_TTL:
+        logging.info(f"Using cached API response for: {url}")
+        task = cached[1]
+    else:
+        task = asyncio.create_task(_fetch_nws(url))
+        task.add_done_callback(functools.partial(_evict_failed_response, url))
+        # Re-insert so the dict stays in fetch order and the oldest entries are evicted first.
+        _response_cache.pop(url, None)
+        _response_cache[url] = (now, task)
+        while len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+            del _response_cache[next(iter(_response_cache))]
+    # Shield the shared fetch so that one cancelled caller doesn't cancel it for everyone else.
+    return await asyncio.shield(task)
+
+
+def _evict_failed_response(url: str, task: asyncio.Task):
+    """Drops failed fetches from the response cache so the next call retries them."""
+    if task.cancelled() or task.exception() is not None or task.result() is None:
+        cached = _response_cache.get(url)
+        if cached is not None and cached[1] is task:
+            del _response_cache[url]
+
+
+async def _fetch_nws(url: str) -> dict[str, Any] | None:
     """Makes a request to the NWS API with proper error handling."""
-    headers = {
-        "User-Agent": USER_AGENT,
-        "Accept": "application/geo+json"
-    }
     logging.info(f"-> Making external API request to: {url}")
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=15.0)
-            response.raise_for_status()
-            logging.info(f"<- Received successful API response (Status: {response.status_code})")
-            return response.json()
-        except httpx.RequestError as e:
-            logging.error(f"!! API request failed: {e}")
-            return None
+    try:
+        response = await _get_client().get(url)
+        response.raise_for_status()
+        logging.info(f"<- Received successful API response (Status: {response.status_code})")
+        # Parse the raw bytes directly, skipping the decode step of response.json().
+        return _loads_json(response.content)
+    except httpx.RequestError as e:
+        logging.error(f"!! API request failed: {e}")
+        return None
+
+
+async def get_points(latitude: float, longitude: float) -> dict[str, Any] | None:
+    """Gets the NWS grid metadata for a location, served from the in-process cache when fresh."""
+    key = (round(latitude, 4), round(longitude, 4))
+    cached = _points_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < POINTS_CACHE_TTL:
+        logging.info(f"Using cached location data for lat={key[0]}, lon={key[1]}")
+        return cached[1]
+
+    points_data = await make_nws_request(f"{NWS_API_BASE}/points/{key[0]},{key[1]}")
+    if points_data and "properties" in points_data:
+        # Re-insert so the dict stays in fetch order and the oldest entries are evicted first.
+        _points_cache.pop(key, None)
+        _points_cache[key] = (time.monotonic(), points_data)
+        while len(_points_cache) > POINTS_CACHE_MAX_ENTRIES:
+            del _points_cache[next(iter(_points_cache))]
+    return points_data
 
 
 @mcp.tool()
-async def get_alerts(state: str) -> str:
+async def get_alerts(state: str) -> dict[str, Any]:
     """Gets active weather alerts for a US state.
     Args:
         state: Two-letter US state code (e.g., CA, NY)
+    Returns:
+        {"state": ..., "alerts": [{"event": ..., "area": ...}, ...]}, or {"message": ...} if there are none.
     """
     logging.info(f"Executing tool 'get_alerts' with state='{state}'")
     url = f"{NWS_API_BASE}/alerts/active/area/{state}"
     data = await make_nws_request(url)
     if not data or "features" not in data:
-        return "Unable to fetch alerts or no alerts found."
+        return {"message": "Unable to fetch alerts or no alerts found."}
     if not data["features"]:
-        return f"No active alerts for the state: {state}."
+        return {"state": state, "alerts": [], "message": f"No active alerts for the state: {state}."}
 
-    alerts = [f"Event: {f['properties'].get('event', 'N/A')}, Area: {f['properties'].get('areaDesc', 'N/A')}" for f in
-              data["features"]]
-    return "\n---\n".join(alerts)
+    alerts = [
+        {"event": props.get("event", "N/A"), "area": props.get("areaDesc", "N/A")}
+        for props in (f["properties"] for f in data["features"])
+    ]
+    return {"state": state, "alerts": alerts}
 
 
 @mcp.tool()
-async def get_forecast(latitude: float, longitude: float) -> str:
+async def get_forecast(latitude: float, longitude: float) -> dict[str, Any]:
     """Gets the weather forecast for a specific location.
     Args:
         latitude: The latitude of the location.
         longitude: The longitude of the location.
+    Returns:
+        {"periods": [{"name": ..., "temperature": ..., "temperature_unit": ..., "forecast": ...}, ...]},
+        or {"message": ...} if no forecast is available.
     """
     logging.info(f"Executing tool 'get_forecast' with lat={latitude}, lon={longitude}")
-    points_url = f"{NWS_API_BASE}/points/{latitude},{longitude}"
-    points_data = await make_nws_request(points_url)
+    points_data = await get_points(latitude, longitude)
     if not points_data or "properties" not in points_data:
-        return "Unable to fetch location data to get forecast."
+        return {"message": "Unable to fetch location data to get forecast."}
 
     forecast_url = points_data["properties"].get("forecast")
     if not forecast_url:
-        return "Could not find a forecast URL for the given coordinates."
+        return {"message": "Could not find a forecast URL for the given coordinates."}
 
     forecast_data = await make_nws_request(forecast_url)
     if not forecast_data or "properties" not in forecast_data:
-        return "Unable to fetch the detailed forecast."
+        return {"message": "Unable to fetch the detailed forecast."}
 
     periods = forecast_data["properties"].get("periods", [])
     if not periods:
-        return "No forecast periods found in the data."
-
-    forecasts = [f"{p['name']}: {p['temperature']}°{p['temperatureUnit']}, {p['detailedForecast']}" for p in
-                 periods[:5]]
-    return "\n---\n".join(forecasts)
+        return {"message": "No forecast periods found in the data."}
+
+    return {
+        "periods": [
+            {
+                "name": p["name"],
+                "temperature": p["temperature"],
+                "temperature_unit": p["temperatureUnit"],
+                "forecast": p["detailedForecast"],
+            }
+            for p in periods[:5]
+        ]
+    }
 
 
 if __name__ == "__main__":
+    try:
+        # Optional: uvloop makes socket and pipe IO faster. It isn't available on Windows,
+        # where the default event loop is used. FastMCP.run doesn't take a loop factory, so uvloop
+        # has to be installed as the event loop policy here even though install() is deprecated.
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     mcp.run(transport='stdio')
\ No newline at end of file